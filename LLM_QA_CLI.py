@@ -1,4 +1,4 @@
-﻿#!/usr/bin/env python3
+#!/usr/bin/env python3
 """
 LLM Question and Answering CLI Application
 Name: Osho Ayomide
@@ -6,14 +6,33 @@ Matric No: 23CG034142
 """
 
 import os
-import string
+import re
+import sys
+from collections import deque
 from dotenv import load_dotenv
 from google import genai
 from google.genai.errors import APIError
 
+from cache import ResponseCache, SemanticCache, make_cache_key, prompt_hash
+
 # Load environment variables
 load_dotenv()
 
+# Tokenizer: one precompiled pass extracts lowercase word tokens,
+# fusing punctuation removal and whitespace splitting
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Exit commands, matched case-insensitively without an extra .lower()
+_EXIT_RE = re.compile(r"^(quit|exit|q)$", re.IGNORECASE)
+
+# Per-question preprocessing printout is opt-in; six stdout writes per
+# question add up and most users only want the answer
+VERBOSE = "--verbose" in sys.argv
+
+# Shared caches (persist across runs)
+response_cache = ResponseCache()
+semantic_cache = SemanticCache()
+
 
 def preprocess_question(question):
     """
@@ -21,77 +40,88 @@ def preprocess_question(question):
     - Lowercasing
     - Tokenization
     - Punctuation removal
-    
+
     Args:
         question (str): Raw input question
-        
+
     Returns:
         tuple: (processed_question, original_question)
     """
     # Store original question
     original = question
-    
+
     # Convert to lowercase
     question_lower = question.lower()
-    
-    # Remove punctuation
-    question_no_punct = question_lower.translate(
-        str.maketrans('', '', string.punctuation)
-    )
-    
-    # Tokenization (split into words)
-    tokens = question_no_punct.split()
-    
+
+    # Strip punctuation and tokenize in a single regex pass
+    tokens = _TOKEN_RE.findall(question_lower)
+
     # Join tokens back
     processed = ' '.join(tokens)
-    
-    print(f\"--- Preprocessing Steps ---\")
-    print(f\"Original: {original}\")
-    print(f\"Lowercased: {question_lower}\")
-    print(f\"Punctuation Removed: {question_no_punct}\")
-    print(f\"Tokens: {tokens}\")
-    print(f\"Processed: {processed}\")
-    print(\"-------------------------\")
-    
+    question_no_punct = processed
+
+    if VERBOSE:
+        print(f"--- Preprocessing Steps ---")
+        print(f"Original: {original}")
+        print(f"Lowercased: {question_lower}")
+        print(f"Punctuation Removed: {question_no_punct}")
+        print(f"Tokens: {tokens}")
+        print(f"Processed: {processed}")
+        print("-------------------------")
+
     return processed, original
 
 
-def query_llm(question, api_key):
+def query_llm(question, client, model, context_chain=None):
     """
     Send question to Google Gemini LLM API
-    
+
     Args:
         question (str): The question to ask
-        api_key (str): Google Gemini API key
-        
+        client (genai.Client): Shared Gemini client
+        model (str): Model name to query
+        context_chain (deque): Hashes of recent questions this session
+
     Returns:
         str: The LLM's answer
     """
     try:
-        # Initialize Gemini client
-        client = genai.Client(api_key=api_key)
-        model = \"gemini-1.5-flash\"
-        
         # Construct prompt
-        prompt = f\"Answer the following question concisely: {question}\"
-        
-        print(f\"Sending to LLM API (Model: {model})...\")
-        
+        prompt = f"Answer the following question concisely: {question}"
+
+        # Check the cache before paying for an API round-trip
+        cache_key = make_cache_key(model, prompt)
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            print("(Answer served from cache)")
+            return cached
+
+        # Paraphrase-tolerant lookup, guarded by conversation context
+        similar = semantic_cache.get(question, context_chain, model=model)
+        if similar is not None:
+            print("(Answer served from semantic cache)")
+            return similar
+
+        print(f"Sending to LLM API (Model: {model})...")
+
         # Generate response
         response = client.models.generate_content(
             model=model,
             contents=prompt
         )
-        
+
         if response and response.text:
+            response_cache.set(cache_key, response.text, model=model)
+            semantic_cache.add(question, response.text, context_chain,
+                               model=model)
             return response.text
         else:
-            return \"No response generated. Please try again.\"
-            
+            return "No response generated. Please try again."
+
     except APIError as e:
-        return f\"API Error: {str(e)}\"
+        return f"API Error: {str(e)}"
     except Exception as e:
-        return f\"Error: {str(e)}\"
+        return f"Error: {str(e)}"
 
 
 def main():
@@ -101,54 +131,58 @@ def main():
     print("Name: Godwin Victoria")
     print("Matric No: 22CH032013")
     print("=" * 60)
-    
+
     # Get API key from environment
-    api_key = os.getenv(\"GEMINI_API_KEY\")
-    
+    api_key = os.getenv("GEMINI_API_KEY")
+
     if not api_key:
-        print(\"
-  ERROR: GEMINI_API_KEY not found!\")
-        print(\"Please create a .env file with:\")
-        print(\"GEMINI_API_KEY=your_api_key_here\")
-        print(\"
-Get your key from: https://makersuite.google.com/app/apikey\")
+        print("\n  ERROR: GEMINI_API_KEY not found!")
+        print("Please create a .env file with:")
+        print("GEMINI_API_KEY=your_api_key_here")
+        print("\nGet your key from: https://makersuite.google.com/app/apikey")
         return
-    
-    print(\"
- API Key loaded successfully\")
-    print(\"
-Type 'quit' or 'exit' to close the application.
-\")
-    
+
+    print("\n API Key loaded successfully")
+    print("\nType 'quit' or 'exit' to close the application.\n")
+
+    # Initialize the Gemini client once; every question reuses its
+    # authenticated HTTP session instead of re-handshaking per call
+    client = genai.Client(api_key=api_key)
+    model = "gemini-1.5-flash"
+
+    # Hashes of the last few questions, used to verify semantic-cache
+    # hits against this session's conversation context
+    context_chain = deque(maxlen=5)
+
     while True:
         # Get user input
-        print(\"-\" * 60)
-        question = input(\"Enter your question: \").strip()
-        
+        print("-" * 60)
+        question = input("Enter your question: ").strip()
+
         # Check for exit command
-        if question.lower() in ['quit', 'exit', 'q']:
-            print(\"
-Thank you for using the LLM Q&A CLI. Goodbye!\")
+        if _EXIT_RE.match(question):
+            print("\nThank you for using the LLM Q&A CLI. Goodbye!")
             break
-        
+
         if not question:
-            print(\"Please enter a valid question.\")
+            print("Please enter a valid question.")
             continue
-        
+
         # Preprocess the question
         processed_question, original_question = preprocess_question(question)
-        
+
         # Query the LLM
-        print(\"Processing your question...\")
-        answer = query_llm(original_question, api_key)
-        
+        print("Processing your question...")
+        answer = query_llm(original_question, client, model, context_chain)
+        context_chain.append(prompt_hash(original_question))
+
         # Display the answer
-        print(\"\" + \"=\" * 60)
-        print(\"ANSWER:\")
-        print(\"=\" * 60)
+        print("\n" + "=" * 60)
+        print("ANSWER:")
+        print("=" * 60)
         print(answer)
-        print(\"=\" * 60 + \"\")
+        print("=" * 60 + "\n")
 
 
-if __name__ == \"__main__\":
+if __name__ == "__main__":
     main()
@@ -1,20 +1,58 @@
+import json
+import logging
 import os
-import string
-from typing import Dict, Tuple, Optional
+import re
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+from typing import Dict, Iterable, Iterator, List, Tuple, Optional
 
+import httpx
+import orjson
 from dotenv import load_dotenv
-from flask import Flask, jsonify, render_template, request
+from flask import (Flask, Response, jsonify, request, send_from_directory,
+                   session, stream_with_context)
+from flask.json.provider import JSONProvider
+from flask_compress import Compress
 from flask_cors import CORS
 from google import genai
 from google.genai.errors import APIError
 
+from batching import QuestionBatcher
+from cache import ResponseCache, SemanticCache, make_cache_key, prompt_hash
+
 # Load environment variables
 load_dotenv()
 
+# Tokenizer: one precompiled pass extracts lowercase word tokens,
+# fusing punctuation removal and whitespace splitting
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+class ORJSONProvider(JSONProvider):
+    """JSON provider backed by orjson, 3-10x faster than stdlib json
+    on the multi-KB answer payloads this app returns"""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
 # Initialize Flask app
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
 CORS(app)
 app.config['JSON_SORT_KEYS'] = False
+app.secret_key = os.getenv("FLASK_SECRET_KEY") or os.urandom(24).hex()
+
+# Compress response bodies; multi-KB LLM answers are mostly prose and
+# shrink 3-5x. SSE responses are untouched (text/event-stream is not
+# in the compressed mimetypes), so streaming is never buffered.
+app.config['COMPRESS_ALGORITHM'] = ['br', 'gzip']
+app.config['COMPRESS_MIN_SIZE'] = 500
+Compress(app)
 
 # Configuration
 class Config:
@@ -23,40 +61,230 @@ class Config:
     MODEL_NAME = "gemini-2.5-flash"
     PORT = int(os.environ.get("PORT", 5000))
     DEBUG = os.getenv("FLASK_DEBUG", "False").lower() == "true"
+    # Reject pathological inputs before they cost API tokens; the UI
+    # caps input at 2000 chars, so anything bigger bypassed the form
+    MAX_QUESTION_CHARS = 4000
+
+
+# Logging: in production keep per-request breadcrumbs at debug level
+# and push emitted records through a queue, so the formatting and
+# write syscalls happen on a background listener thread instead of the
+# request thread
+if Config.DEBUG:
+    app.logger.setLevel(logging.DEBUG)
+else:
+    app.logger.setLevel(logging.WARNING)
+    _log_queue: SimpleQueue = SimpleQueue()
+    _log_listener = QueueListener(_log_queue, logging.StreamHandler())
+    _log_listener.start()
+    app.logger.handlers = [QueueHandler(_log_queue)]
+    app.logger.propagate = False
 
 
 class GeminiClient:
     """Wrapper for Google Gemini API client"""
-    
+
+    # At most two speculative calls in flight, so prefetching can
+    # never starve real requests
+    _prefetch_semaphore = threading.BoundedSemaphore(2)
+
+    # Exponential backoff bounds for negative caching of API errors
+    _BACKOFF_INITIAL = 1.0
+    _BACKOFF_CAP = 60.0
+
     def __init__(self, api_key: str, model: str):
         self.api_key = api_key
         self.model = model
         self.client: Optional[genai.Client] = None
+        self.cache = ResponseCache()
+        self.semantic_cache = SemanticCache()
+        # _err:{type} -> (retry_at, backoff, last error); when Gemini
+        # is failing, new calls re-raise the cached error instantly
+        # instead of hammering a down service
+        self._error_state: Dict[str, Tuple[float, float, APIError]] = {}
+        self._error_lock = threading.Lock()
         self._initialize()
+        self.batcher = QuestionBatcher(self._raw_generate)
     
     def _initialize(self):
         """Initialize the Gemini client"""
         try:
-            self.client = genai.Client(api_key=self.api_key)
+            # Shared HTTP/2 transport: keep-alive skips the TLS
+            # handshake after the first call and concurrent requests
+            # multiplex over one connection
+            transport = httpx.HTTPTransport(
+                http2=True,
+                limits=httpx.Limits(
+                    max_keepalive_connections=20,
+                    keepalive_expiry=300
+                )
+            )
+            self.client = genai.Client(
+                api_key=self.api_key,
+                http_options={'client_args': {'transport': transport}}
+            )
+            # Pre-bind the hot-path methods once; per-request code then
+            # skips the client.models.* attribute chain entirely
+            self._generate = self.client.models.generate_content
+            self._generate_stream = self.client.models.generate_content_stream
             app.logger.info(f"✓ Gemini API initialized (Model: {self.model})")
         except Exception as e:
             app.logger.error(f"Failed to initialize Gemini client: {e}")
             raise
     
-    def generate_response(self, prompt: str) -> str:
+    def cached_response(self,
+                        prompt: str,
+                        context_chain: Optional[Iterable[str]] = None
+                        ) -> Optional[str]:
+        """
+        Return a cached answer without calling the API, or None.
+
+        Checks the exact-match cache first, then the semantic cache
+        (which catches paraphrases; the context chain guards against
+        cross-conversation false hits).
+        """
+        key = make_cache_key(self.model, prompt)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        return self.semantic_cache.get(prompt, context_chain,
+                                       model=self.model)
+
+    def generate_response(self,
+                          prompt: str,
+                          context_chain: Optional[Iterable[str]] = None) -> str:
         """Generate response from the LLM"""
-        if not self.client:
-            raise RuntimeError("Gemini client not initialized")
-        
-        response = self.client.models.generate_content(
-            model=self.model,
-            contents=prompt
-        )
-        
+        cached = self.cached_response(prompt, context_chain)
+        if cached is not None:
+            return cached
+        return self.generate_uncached(prompt, context_chain)
+
+    def generate_uncached(self,
+                          prompt: str,
+                          context_chain: Optional[Iterable[str]] = None) -> str:
+        """
+        Call Gemini (via the batcher) and cache the answer.
+
+        Performs no cache lookup: callers that already probed the
+        cache use this directly so the prompt is not embedded and
+        searched a second time on every miss.
+        """
+        text = self.batcher.submit(prompt).result()
+        self.cache.set(make_cache_key(self.model, prompt), text,
+                       model=self.model)
+        self.semantic_cache.add(prompt, text, context_chain,
+                                model=self.model)
+        return text
+
+    def prefetch_followups(self,
+                           question: str,
+                           context_chain: Optional[Iterable[str]] = None
+                           ) -> None:
+        """
+        Speculatively answer likely follow-ups to a just-asked question
+        and warm the caches with them, hiding their generation time
+        inside the user's reading time. Best-effort: failures are
+        logged and dropped, and prefetching yields when the semaphore
+        is contended.
+        """
+        followups = [
+            f"Follow-up to '{question}': give an example",
+            f"Summarize answer to '{question}' in one sentence",
+        ]
+        chain = list(context_chain or [])
+
+        def worker():
+            for followup in followups:
+                if not self._prefetch_semaphore.acquire(blocking=False):
+                    return
+                try:
+                    key = make_cache_key(self.model, followup)
+                    if self.cache.get(key) is not None:
+                        continue
+                    text = self._raw_generate(followup)
+                    self.cache.set(key, text, model=self.model)
+                    self.semantic_cache.add(followup, text, chain,
+                                            model=self.model)
+                except Exception as e:
+                    app.logger.debug(f"Prefetch failed: {e}")
+                finally:
+                    self._prefetch_semaphore.release()
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def _error_key(self, e: APIError) -> str:
+        return f"_err:{getattr(e, 'code', None) or type(e).__name__}"
+
+    def _check_error_backoff(self) -> None:
+        """Re-raise a recent APIError while its backoff window is open"""
+        now = time.monotonic()
+        with self._error_lock:
+            for retry_at, _, error in self._error_state.values():
+                if now < retry_at:
+                    raise error
+
+    def _record_api_error(self, e: APIError) -> None:
+        """Cache the failure, doubling the backoff on repeats"""
+        key = self._error_key(e)
+        with self._error_lock:
+            previous = self._error_state.get(key)
+            backoff = (min(previous[1] * 2, self._BACKOFF_CAP)
+                       if previous else self._BACKOFF_INITIAL)
+            self._error_state[key] = (time.monotonic() + backoff, backoff, e)
+
+    def _clear_error_backoff(self) -> None:
+        if self._error_state:
+            with self._error_lock:
+                self._error_state.clear()
+
+    def _raw_generate(self, prompt: str) -> str:
+        """Uncached, unbatched Gemini call; runs on batcher threads"""
+        self._check_error_backoff()
+        try:
+            response = self._generate(
+                model=self.model,
+                contents=prompt
+            )
+        except APIError as e:
+            self._record_api_error(e)
+            raise
+        self._clear_error_backoff()
         if response and response.text:
             return response.text
-        else:
-            return "I couldn't generate a response. Please try again."
+        return "I couldn't generate a response. Please try again."
+
+    def stream_uncached(self,
+                        prompt: str,
+                        context_chain: Optional[Iterable[str]] = None
+                        ) -> Iterator[str]:
+        """
+        Stream chunks from the LLM as they arrive, caching the
+        assembled text once generation finishes.
+
+        Performs no cache lookup; callers that already probed the
+        cache yield a hit themselves instead of re-probing here.
+        """
+        self._check_error_backoff()
+        parts = []
+        try:
+            for chunk in self._generate_stream(
+                model=self.model,
+                contents=prompt
+            ):
+                if chunk.text:
+                    parts.append(chunk.text)
+                    yield chunk.text
+        except APIError as e:
+            self._record_api_error(e)
+            raise
+        self._clear_error_backoff()
+
+        full_text = "".join(parts)
+        if full_text:
+            self.cache.set(make_cache_key(self.model, prompt), full_text,
+                           model=self.model)
+            self.semantic_cache.add(prompt, full_text, context_chain,
+                                    model=self.model)
 
 
 # Initialize Gemini client
@@ -70,13 +298,59 @@ if Config.GEMINI_API_KEY:
 else:
     app.logger.warning("GEMINI_API_KEY not found in environment variables!")
 
+
+def reinitialize_worker():
+    """
+    Rebuild state that does not survive a gunicorn fork.
+
+    With preload_app the module is imported once in the master; each
+    worker then needs its own HTTP/TLS connections (the pooled sockets
+    are not fork-safe) and fresh copies of the threads the master
+    started, which do not exist in the child. Called from the
+    post_fork hook in gunicorn.conf.py.
+    """
+    if gemini_client is not None:
+        gemini_client._initialize()
+        gemini_client.batcher = QuestionBatcher(gemini_client._raw_generate)
+        # SQLite connections opened in the preloaded master must not
+        # be used from forked children
+        gemini_client.cache.reopen()
+        gemini_client.semantic_cache.reopen()
+    if not Config.DEBUG:
+        QueueListener(_log_queue, logging.StreamHandler()).start()
+
+# The context chain (hashes of the last few questions) lives in the
+# signed session cookie itself: nothing per-visitor accumulates in
+# worker memory and every worker sees the same chain
+_CONTEXT_CHAIN_LEN = 5
+
+
+def get_context_chain() -> List[str]:
+    """Return the current session's context chain (oldest first)"""
+    return session.get("context_chain") or []
+
+
+def remember_in_context(question: str) -> None:
+    """Record a question's hash in the session's context chain"""
+    chain = session.get("context_chain") or []
+    session["context_chain"] = \
+        (chain + [prompt_hash(question)])[-_CONTEXT_CHAIN_LEN:]
+
+
 # --- Flask Routes ---
 
 
 @app.route("/")
 def index():
-    """Serve the main HTML page"""
-    return render_template("index.html")
+    """
+    Serve the main HTML page.
+
+    index.html is plain static markup, so it is sent straight from
+    static/ without a Jinja2 render (and can be served by a reverse
+    proxy with sendfile in front of the app, bypassing Python
+    entirely).
+    """
+    return send_from_directory(app.static_folder, "index.html")
 
 
 class TextPreprocessor:
@@ -98,19 +372,17 @@ class TextPreprocessor:
         """
         # Step 1: Store original
         original = text
-        
+
         # Step 2: Convert to lowercase
         lowercased = text.lower()
-        
-        # Step 3: Remove punctuation
-        translator = str.maketrans('', '', string.punctuation)
-        no_punctuation = lowercased.translate(translator)
-        
-        # Step 4: Tokenization (whitespace splitting)
-        tokens = no_punctuation.split()
-        
+
+        # Steps 3+4: Strip punctuation and tokenize in a single
+        # regex pass instead of translate + split
+        tokens = _TOKEN_RE.findall(lowercased)
+
         # Step 5: Reconstruct processed text
         processed = ' '.join(tokens)
+        no_punctuation = processed
         
         return {
             "original": original,
@@ -162,22 +434,44 @@ def ask_question():
                 "status": "error"
             }), 400
 
-        # Apply text preprocessing
-        preprocessing = TextPreprocessor.preprocess(question)
-        
-        app.logger.info(f"Processing question: {question[:50]}...")
+        if len(question) > Config.MAX_QUESTION_CHARS:
+            return jsonify({
+                "error": "Question too long",
+                "status": "error"
+            }), 413
 
-        # Generate AI response
-        answer = gemini_client.generate_response(question)
-        
-        app.logger.info("Response generated successfully")
+        app.logger.debug(f"Processing question: {question[:50]}...")
 
-        return jsonify({
+        context_chain = get_context_chain()
+        show_steps = request.args.get("debug") == "1"
+
+        # Cache hits skip preprocessing entirely — the pedagogical
+        # steps are display-only and Gemini takes the raw question
+        answer = gemini_client.cached_response(question, context_chain)
+        cache_hit = answer is not None
+
+        preprocessing = None
+        if not cache_hit or show_steps:
+            preprocessing = TextPreprocessor.preprocess(question)
+
+        if not cache_hit:
+            answer = gemini_client.generate_uncached(question,
+                                                     context_chain)
+        remember_in_context(question)
+
+        # Warm the caches for likely follow-ups while the user reads
+        gemini_client.prefetch_followups(question, context_chain)
+
+        app.logger.debug("Response generated successfully")
+
+        payload = {
             "question": question,
             "answer": answer,
-            "preprocessing": preprocessing,
             "status": "success"
-        }), 200
+        }
+        if preprocessing is not None:
+            payload["preprocessing"] = preprocessing
+        return jsonify(payload), 200
 
     except APIError as e:
         app.logger.error(f"Gemini API Error: {str(e)}")
@@ -194,6 +488,90 @@ def ask_question():
         }), 500
 
 
+@app.route("/api/ask/stream", methods=["POST"])
+def ask_question_stream():
+    """
+    Streaming variant of /api/ask using Server-Sent Events.
+
+    Emits `data: {"delta": str}` events as answer chunks arrive, then a
+    final `data: {"done": true, "preprocessing": dict, "status": str}`
+    event, so the browser can render the answer as it is generated
+    instead of waiting for the full response.
+    """
+    if not gemini_client:
+        return jsonify({
+            "error": "AI service not configured. Please check API key.",
+            "status": "error"
+        }), 503
+
+    data = request.get_json()
+
+    if not data or "question" not in data:
+        return jsonify({
+            "error": "Missing 'question' field in request body",
+            "status": "error"
+        }), 400
+
+    question = data["question"].strip()
+
+    if not question:
+        return jsonify({
+            "error": "Question cannot be empty",
+            "status": "error"
+        }), 400
+
+    if len(question) > Config.MAX_QUESTION_CHARS:
+        return jsonify({
+            "error": "Question too long",
+            "status": "error"
+        }), 413
+
+    # Read the chain and record this question now — the session
+    # cookie cannot change once the body starts streaming
+    context_chain = get_context_chain()
+    remember_in_context(question)
+
+    # One cache probe serves both decisions: whether to build the
+    # display-only preprocessing dict and whether to call Gemini
+    cached = gemini_client.cached_response(question, context_chain)
+
+    preprocessing = None
+    if request.args.get("debug") == "1" or cached is None:
+        preprocessing = TextPreprocessor.preprocess(question)
+
+    def generate():
+        try:
+            if cached is not None:
+                yield f"data: {json.dumps({'delta': cached})}\n\n"
+            else:
+                for piece in gemini_client.stream_uncached(question,
+                                                           context_chain):
+                    yield f"data: {json.dumps({'delta': piece})}\n\n"
+            gemini_client.prefetch_followups(question, context_chain)
+            done = {
+                "done": True,
+                "preprocessing": preprocessing,
+                "status": "success"
+            }
+            yield f"data: {json.dumps(done)}\n\n"
+        except APIError as e:
+            app.logger.error(f"Gemini API Error: {str(e)}")
+            error = {"error": f"AI service error: {str(e)}",
+                     "status": "error"}
+            yield f"data: {json.dumps(error)}\n\n"
+        except Exception as e:
+            app.logger.error(f"Unexpected error: {str(e)}")
+            error = {"error": "An unexpected error occurred. "
+                              "Please try again.",
+                     "status": "error"}
+            yield f"data: {json.dumps(error)}\n\n"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream"
+    )
+
+
 def main():
     """Run the Flask application"""
     print("\n" + "=" * 70)
@@ -215,11 +593,22 @@ def main():
     print(f"✓ Debug Mode: {Config.DEBUG}")
     print("\nPress Ctrl+C to stop the server\n")
 
-    app.run(
-        debug=Config.DEBUG,
-        host="0.0.0.0",
-        port=Config.PORT
-    )
+    if Config.DEBUG:
+        # Werkzeug dev server: single-threaded, for local debugging only
+        app.run(
+            debug=True,
+            host="0.0.0.0",
+            port=Config.PORT
+        )
+    else:
+        # The dev server serializes every request behind the blocking
+        # Gemini call; production must run under gunicorn so a slow
+        # answer for one user does not stall all the others
+        print("⚠️  Production mode: start the server with gunicorn:")
+        print(f"  gunicorn -w 4 -k gthread --threads 8 "
+              f"-b 0.0.0.0:{Config.PORT} wsgi:application")
+        print("\n(Set FLASK_DEBUG=true to use the dev server locally.)")
+        print("=" * 70 + "\n")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,110 @@
+"""
+Micro-batching for Gemini calls.
+
+Under concurrent load every question used to trigger its own API
+round-trip. A QuestionBatcher coalesces questions that arrive within a
+short window into one numbered prompt, sends a single generate call,
+and splits the response back out per question — one billed request for
+the whole batch. With a single pending question the prompt is sent
+unchanged, so light traffic behaves exactly as before.
+"""
+
+import queue
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+# Matches the "1) ..." numbering the batch prompt asks the model for
+_ANSWER_SPLIT_RE = re.compile(r"^\s*(\d+)\)\s*", re.MULTILINE)
+
+_BATCH_HEADER = "Answer each numbered question concisely.\n"
+
+
+class QuestionBatcher:
+    """Coalesces concurrent questions into single Gemini calls"""
+
+    def __init__(self,
+                 generate: Callable[[str], str],
+                 max_batch: int = 8,
+                 max_wait: float = 0.02):
+        self._generate = generate
+        self._queue: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        # Batches are dispatched to a pool so one slow batch does not
+        # serialize the ones collected after it
+        self._pool = ThreadPoolExecutor(
+            max_workers=4, thread_name_prefix="question-batch"
+        )
+        self._thread = threading.Thread(
+            target=self._run, name="question-batcher", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, question: str) -> Future:
+        """Enqueue a question; the Future resolves to its answer"""
+        future: Future = Future()
+        self._queue.put((question, future))
+        return future
+
+    def _run(self):
+        while True:
+            # Block for the first question, then give stragglers
+            # max_wait seconds to join the batch
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._pool.submit(self._process, batch)
+
+    def _process(self, batch: List[Tuple[str, Future]]):
+        if len(batch) == 1:
+            question, future = batch[0]
+            try:
+                future.set_result(self._generate(question))
+            except Exception as e:
+                future.set_exception(e)
+            return
+
+        prompt = _BATCH_HEADER + "\n".join(
+            f"{i}) {question}"
+            for i, (question, _) in enumerate(batch, start=1)
+        )
+        try:
+            text = self._generate(prompt)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        answers = self._split_answers(text, len(batch))
+        if answers is None:
+            # Model ignored the numbering; fall back to one call each
+            for question, future in batch:
+                try:
+                    future.set_result(self._generate(question))
+                except Exception as e:
+                    future.set_exception(e)
+            return
+
+        for (_, future), answer in zip(batch, answers):
+            future.set_result(answer)
+
+    @staticmethod
+    def _split_answers(text: str, count: int) -> Optional[List[str]]:
+        """Split a numbered response; None when any answer is missing"""
+        parts = _ANSWER_SPLIT_RE.split(text)
+        answers = {}
+        for i in range(1, len(parts) - 1, 2):
+            answers[int(parts[i])] = parts[i + 1].strip()
+        if any(n not in answers for n in range(1, count + 1)):
+            return None
+        return [answers[n] for n in range(1, count + 1)]
@@ -0,0 +1,458 @@
+"""
+Shared response cache for the LLM Q&A applications.
+
+Provides an exact-match cache keyed by a SHA-256 hash of the
+(model, normalized prompt) pair, backed by SQLite so cached answers
+survive restarts and can be shared by concurrent server workers.
+"""
+
+import atexit
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Iterable, Optional, Tuple
+
+# Optional semantic-cache dependencies; the exact-match cache works
+# without them and SemanticCache degrades to a no-op when they are
+# missing, so a deployment without the ML stack still runs.
+try:
+    import hnswlib
+    from sentence_transformers import SentenceTransformer
+except ImportError:
+    hnswlib = None
+    SentenceTransformer = None
+
+# Default on-disk locations for the cache database and vector index
+DEFAULT_CACHE_PATH = "llm_cache.db"
+DEFAULT_INDEX_PATH = "llm_cache.hnsw"
+
+# Questions referring back to earlier turns ("change it to red") are
+# only safe to serve from cache when the conversation context matches.
+_PRONOUN_RE = re.compile(r"\b(it|that|this|they|them)\b", re.IGNORECASE)
+
+
+def prompt_hash(prompt: str) -> str:
+    """Model-agnostic hash of a normalized prompt, for context chains"""
+    normalized = unicodedata.normalize("NFC", prompt).strip().lower()
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+def is_standalone_question(prompt: str) -> bool:
+    """True when the question carries no back-references to prior turns"""
+    return _PRONOUN_RE.search(prompt) is None
+
+
+def context_overlap(chain_a: Iterable[str], chain_b: Iterable[str]) -> float:
+    """Jaccard similarity between two context hash chains"""
+    set_a, set_b = set(chain_a), set(chain_b)
+    if not set_a and not set_b:
+        return 1.0
+    union = set_a | set_b
+    return len(set_a & set_b) / len(union)
+
+
+def make_cache_key(model: str, prompt: str) -> str:
+    """
+    Build a deterministic cache key for a (model, prompt) pair.
+
+    The prompt is NFC-normalized, stripped and lowercased so that
+    trivially different spellings of the same question hash to the
+    same key. The model name is included so answers from different
+    models never collide.
+
+    Args:
+        model: Model identifier (e.g. "gemini-2.5-flash")
+        prompt: Raw user prompt
+
+    Returns:
+        Hex-encoded SHA-256 digest usable as a primary key
+    """
+    normalized = unicodedata.normalize("NFC", prompt).strip().lower()
+    return hashlib.sha256(f"{model}\x00{normalized}".encode()).hexdigest()
+
+
+class ResponseCache:
+    """
+    Exact-match LLM response cache backed by SQLite.
+
+    A bounded in-memory LRU sits in front of the database so repeat
+    hits cost one dict lookup instead of a SQLite round-trip. Entries
+    expire after `ttl` seconds (lazily, on access) and the LRU evicts
+    its oldest entry in O(1) once `max_entries` is reached, so memory
+    stays bounded no matter how long the server runs.
+    """
+
+    def __init__(self,
+                 path: str = DEFAULT_CACHE_PATH,
+                 max_entries: int = 10000,
+                 ttl: float = 86400.0):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # key -> (response, model, expires_at)
+        self._lru: "OrderedDict[str, Tuple[str, str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        # WAL allows concurrent readers alongside a single writer,
+        # which matters once multiple server workers share the file.
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                response TEXT,
+                created_at REAL,
+                last_used REAL
+            )
+            """
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for `key`, or None on a miss"""
+        now = time.time()
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry is not None:
+                response, model, expires_at = entry
+                if now < expires_at:
+                    self._lru.move_to_end(key)
+                    return response
+                # Lazily evict the expired entry
+                del self._lru[key]
+
+            row = self._conn.execute(
+                "SELECT response, model, created_at FROM responses "
+                "WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                return None
+            response, model, created_at = row
+            if now - created_at >= self.ttl:
+                self._conn.execute(
+                    "DELETE FROM responses WHERE key = ?", (key,)
+                )
+                self._conn.commit()
+                return None
+            self._conn.execute(
+                "UPDATE responses SET last_used = ? WHERE key = ?",
+                (now, key),
+            )
+            self._conn.commit()
+            self._remember(key, response, model, created_at + self.ttl)
+            return response
+
+    def set(self, key: str, response: str, model: str = "") -> None:
+        """Store a response under `key`, replacing any previous entry"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses "
+                "(key, model, response, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, model, response, now, now),
+            )
+            self._conn.commit()
+            self._remember(key, response, model, now + self.ttl)
+
+    def reopen(self) -> None:
+        """
+        Open a fresh database connection for this process.
+
+        SQLite connections must not be used across a fork; after
+        gunicorn forks a worker the inherited connection is dropped
+        unused (closing it could disturb the parent's handle) and
+        replaced with a new one. The in-memory LRU is plain data and
+        stays valid in the child.
+        """
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+
+    def invalidate_by_model(self, model: str) -> None:
+        """Drop every entry produced by `model` (e.g. after an upgrade)"""
+        with self._lock:
+            for key in [k for k, (_, m, _) in self._lru.items()
+                        if m == model]:
+                del self._lru[key]
+            self._conn.execute(
+                "DELETE FROM responses WHERE model = ?", (model,)
+            )
+            self._conn.commit()
+
+    def _remember(self, key: str, response: str, model: str,
+                  expires_at: float) -> None:
+        """Insert into the LRU, evicting the oldest entry on overflow.
+
+        Caller must hold self._lock."""
+        self._lru[key] = (response, model, expires_at)
+        self._lru.move_to_end(key)
+        if len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+
+class SemanticCache:
+    """
+    Paraphrase-tolerant response cache using local sentence embeddings.
+
+    Questions are embedded with all-MiniLM-L6-v2 (runs locally, so the
+    cache keeps working even when Gemini is unreachable) and stored in
+    an HNSW index. A lookup returns the stored answer of the nearest
+    neighbour when its cosine similarity clears the threshold, so
+    rephrasings like "Tell me about Philadelphia" and "Talk to me about
+    the city of Philadelphia" share one cached answer.
+    """
+
+    EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+    EMBEDDING_DIM = 384
+
+    # Persist the index to disk once per this many additions rather
+    # than on every add: a save writes the whole index (megabytes at
+    # capacity) under the lock, and _sync_index re-embeds anything an
+    # unsaved crash loses, so deferring costs nothing but staleness.
+    SAVE_EVERY = 32
+
+    def __init__(self,
+                 db_path: str = DEFAULT_CACHE_PATH,
+                 index_path: str = DEFAULT_INDEX_PATH,
+                 threshold: float = 0.92,
+                 max_elements: int = 10000,
+                 ttl: float = 86400.0):
+        self.threshold = threshold
+        self.db_path = db_path
+        self.index_path = index_path
+        self.max_elements = max_elements
+        self.ttl = ttl
+        self.available = hnswlib is not None and SentenceTransformer is not None
+        if not self.available:
+            return
+
+        self._lock = threading.Lock()
+        self.embedder = SentenceTransformer(self.EMBEDDING_MODEL)
+
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # AUTOINCREMENT makes SQLite the single label authority: every
+        # worker process gets distinct, never-reused labels, so an
+        # indexed embedding can never be remapped to another worker's
+        # answer
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS semantic_entries (
+                label_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                question TEXT,
+                answer TEXT,
+                context_chain TEXT DEFAULT '',
+                model TEXT DEFAULT '',
+                created_at REAL DEFAULT 0
+            )
+            """
+        )
+        # Upgrade databases created before these columns existed
+        for column in ("context_chain TEXT DEFAULT ''",
+                       "model TEXT DEFAULT ''",
+                       "created_at REAL DEFAULT 0"):
+            try:
+                self._conn.execute(
+                    f"ALTER TABLE semantic_entries ADD COLUMN {column}"
+                )
+            except sqlite3.OperationalError:
+                pass
+        self._conn.commit()
+
+        # allow_replace_deleted lets evicted entries' slots be reused,
+        # so the index keeps accepting additions at capacity
+        self._index = hnswlib.Index(space="cosine", dim=self.EMBEDDING_DIM)
+        try:
+            self._index.load_index(index_path, max_elements=max_elements,
+                                   allow_replace_deleted=True)
+        except (OSError, RuntimeError):
+            self._index.init_index(max_elements=max_elements,
+                                   allow_replace_deleted=True)
+        self._sync_index()
+        self._pending_saves = 0
+        atexit.register(self._flush_index)
+
+    def _sync_index(self) -> None:
+        """
+        Index any rows the on-disk index file is missing.
+
+        The SQLite table is shared by all worker processes but each
+        holds its own in-memory HNSW index; entries another worker
+        added after this index file was last saved are re-embedded
+        here from their stored questions.
+        """
+        indexed = set(self._index.get_ids_list())
+        rows = self._conn.execute(
+            "SELECT label_id, question FROM semantic_entries"
+        ).fetchall()
+        missing = [row for row in rows if row[0] not in indexed]
+        capacity = (self._index.get_max_elements()
+                    - self._index.get_current_count())
+        missing = missing[:max(capacity, 0)]
+        if not missing:
+            return
+        vecs = self.embedder.encode(
+            [question for _, question in missing],
+            normalize_embeddings=True,
+        )
+        self._index.add_items(vecs, [label for label, _ in missing],
+                              replace_deleted=True)
+
+    def reopen(self) -> None:
+        """
+        Open a fresh database connection for this process.
+
+        Same fork-safety rule as ResponseCache.reopen: the connection
+        inherited from the parent process is dropped unused. The
+        embedder and the in-memory index are plain memory and remain
+        valid in the child.
+        """
+        if not self.available:
+            return
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+
+    def _save_index(self) -> None:
+        """Atomically persist the index so a concurrent writer can
+        never leave a half-written file behind.
+
+        Caller must hold self._lock."""
+        tmp_path = self.index_path + ".tmp"
+        self._index.save_index(tmp_path)
+        os.replace(tmp_path, self.index_path)
+        self._pending_saves = 0
+
+    def _flush_index(self) -> None:
+        """Persist any additions deferred by SAVE_EVERY (atexit hook)"""
+        if not self.available:
+            return
+        with self._lock:
+            if self._pending_saves:
+                self._save_index()
+
+    def get(self,
+            prompt: str,
+            context_chain: Optional[Iterable[str]] = None,
+            model: str = "") -> Optional[str]:
+        """
+        Return a cached answer for a semantically similar question.
+
+        A candidate hit is only returned when it has not expired, it
+        was produced by the requested `model`, and the question stands
+        on its own (no pronoun back-references) or the caller's context
+        chain overlaps the one stored with the entry (Jaccard >= 0.5).
+        The latter stops "change it to red" from matching across
+        unrelated conversations.
+        """
+        if not self.available:
+            return None
+        with self._lock:
+            if self._index.get_current_count() == 0:
+                return None
+            vec = self.embedder.encode(prompt, normalize_embeddings=True)
+            try:
+                labels, dists = self._index.knn_query(vec, k=1)
+            except RuntimeError:
+                # get_current_count() still counts mark_deleted'd
+                # elements, so once expiry/invalidation has removed
+                # every live entry the guard above passes and the
+                # query raises instead. That is just an empty cache.
+                return None
+            label = int(labels[0][0])
+            similarity = 1.0 - float(dists[0][0])
+            if similarity < self.threshold:
+                return None
+            row = self._conn.execute(
+                "SELECT answer, context_chain, model, created_at "
+                "FROM semantic_entries WHERE label_id = ?",
+                (label,),
+            ).fetchone()
+            if row is None:
+                return None
+            answer, stored_chain, stored_model, created_at = row
+            if time.time() - (created_at or 0.0) >= self.ttl:
+                # Lazily expire: stale answers age out on access
+                self._drop_entry(label)
+                self._conn.commit()
+                return None
+            if model and stored_model and stored_model != model:
+                return None
+            if not is_standalone_question(prompt):
+                current = list(context_chain or [])
+                stored = stored_chain.split() if stored_chain else []
+                if context_overlap(current, stored) < 0.5:
+                    return None
+            return answer
+
+    def add(self,
+            prompt: str,
+            answer: str,
+            context_chain: Optional[Iterable[str]] = None,
+            model: str = "") -> None:
+        """Index a question/answer pair for future similarity lookups,
+        evicting the oldest entry when the cache is full"""
+        if not self.available:
+            return
+        with self._lock:
+            live = self._conn.execute(
+                "SELECT COUNT(*) FROM semantic_entries"
+            ).fetchone()[0]
+            while live >= self.max_elements:
+                oldest = self._conn.execute(
+                    "SELECT label_id FROM semantic_entries "
+                    "ORDER BY created_at, label_id LIMIT 1"
+                ).fetchone()
+                if oldest is None:
+                    break
+                self._drop_entry(oldest[0])
+                live -= 1
+            vec = self.embedder.encode(prompt, normalize_embeddings=True)
+            cursor = self._conn.execute(
+                "INSERT INTO semantic_entries "
+                "(question, answer, context_chain, model, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (prompt, answer, " ".join(context_chain or []),
+                 model, time.time()),
+            )
+            label = cursor.lastrowid
+            self._conn.commit()
+            self._index.add_items(vec, [label], replace_deleted=True)
+            self._pending_saves += 1
+            if self._pending_saves >= self.SAVE_EVERY:
+                self._save_index()
+
+    def invalidate_by_model(self, model: str) -> None:
+        """Drop every entry produced by `model` (e.g. after an upgrade)"""
+        if not self.available:
+            return
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT label_id FROM semantic_entries WHERE model = ?",
+                (model,),
+            ).fetchall()
+            for (label,) in rows:
+                self._drop_entry(label)
+            self._conn.commit()
+            self._save_index()
+
+    def _drop_entry(self, label: int) -> None:
+        """Remove one entry from the table and the index.
+
+        Caller must hold self._lock and commit afterwards."""
+        try:
+            self._index.mark_deleted(label)
+        except RuntimeError:
+            # Label not present in this process's index copy
+            pass
+        self._conn.execute(
+            "DELETE FROM semantic_entries WHERE label_id = ?", (label,)
+        )
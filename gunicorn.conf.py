@@ -0,0 +1,22 @@
+"""
+gunicorn configuration.
+
+preload_app loads the application once in the master process so forked
+workers share memory copy-on-write, but the Gemini client's HTTP/TLS
+connection state and the app's helper threads (batcher, log listener)
+do not survive the fork — reusing them causes hangs and dead queues.
+post_fork rebuilds that state in each worker.
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = 4
+worker_class = "gthread"
+threads = 8
+preload_app = True
+
+
+def post_fork(server, worker):
+    from app import reinitialize_worker
+    reinitialize_worker()
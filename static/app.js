@@ -57,6 +57,7 @@ const chatState = new ChatState();
 
 // API Configuration
 const API_ENDPOINT = "/api/ask";
+const STREAM_ENDPOINT = "/api/ask/stream";
 
 // Utility Functions
 const utils = {
@@ -248,6 +249,53 @@ const api = {
       );
     }
   },
+
+  async streamQuestion(question, onDelta) {
+    const response = await fetch(STREAM_ENDPOINT, {
+      method: "POST",
+      headers: {
+        "Content-Type": "application/json",
+      },
+      body: JSON.stringify({ question }),
+    });
+
+    if (!response.ok || !response.body) {
+      const data = await response.json().catch(() => ({}));
+      throw new Error(data.error || "Failed to get response");
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    const result = { answer: "", preprocessing: null };
+    let buffer = "";
+
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      // SSE events are separated by a blank line
+      const events = buffer.split("\n\n");
+      buffer = events.pop();
+
+      for (const event of events) {
+        if (!event.startsWith("data: ")) continue;
+        const payload = JSON.parse(event.slice(6));
+        if (payload.error) {
+          throw new Error(payload.error);
+        }
+        if (payload.delta) {
+          result.answer += payload.delta;
+          onDelta(result.answer);
+        }
+        if (payload.done) {
+          result.preprocessing = payload.preprocessing;
+        }
+      }
+    }
+
+    return result;
+  },
 };
 
 // Event Handlers
@@ -272,13 +320,25 @@ const handlers = {
     ui.showTyping();
 
     try {
-      // Send request
-      const response = await api.sendQuestion(question);
+      // Stream the answer, rendering chunks as they arrive
+      let streamingEl = null;
+      const response = await api.streamQuestion(question, (textSoFar) => {
+        if (!streamingEl) {
+          ui.removeTypingIndicator();
+          ui.hideWelcome();
+          streamingEl = ui.createMessageElement("ai", "");
+          elements.chatMessages.appendChild(streamingEl);
+        }
+        streamingEl.querySelector(".message-content").innerHTML =
+          utils.formatText(textSoFar);
+        utils.scrollToBottom();
+      });
 
-      // Remove typing indicator
       ui.removeTypingIndicator();
 
-      // Add AI response with preprocessing info
+      // Replace the streaming element with the final message so the
+      // preprocessing info is attached
+      if (streamingEl) streamingEl.remove();
       chatState.addMessage("ai", response.answer, {
         preprocessing: response.preprocessing,
       });
@@ -0,0 +1,11 @@
+"""
+WSGI entry point for production servers.
+
+Run with:
+    gunicorn -w 4 -k gthread --threads 8 -b 0.0.0.0:$PORT wsgi:application
+
+Threaded workers suit this app because each request is I/O-bound on
+the Gemini API call, so threads spend most of their time waiting.
+"""
+
+from app import app as application